@@ -0,0 +1,14 @@
+"""Filesystem path helpers shared across the package."""
+
+import functools
+from pathlib import Path
+
+
+@functools.cache
+def find_project_root() -> Path:
+    current = Path(__file__).resolve()
+    while current != current.parent:
+        if (current / 'pyproject.toml').exists():
+            return current
+        current = current.parent
+    return current
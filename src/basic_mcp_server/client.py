@@ -6,16 +6,17 @@ Connects to an MCP server using streamable HTTP transport with OAuth.
 """
 
 import asyncio
+import html
 import json
 import os
+import re
 import threading
-import time
 import webbrowser
 import traceback
 from datetime import timedelta
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Any, Literal
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import unquote_plus, urlparse
 
 import click
 
@@ -27,6 +28,21 @@ from mcp.client.streamable_http import streamablehttp_client
 from mcp.shared.auth import OAuthClientInformationFull, OAuthClientMetadata, OAuthToken
 
 
+SUPPORTED_TRANSPORTS = ("sse", "streamable-http")
+
+_CLIENT_METADATA = OAuthClientMetadata.model_validate(
+    {
+        "client_name": "fps_github_mcp_server",
+        "redirect_uris": ["http://localhost:3030/callback"],
+        "grant_types": ["authorization_code", "refresh_token"],
+        "response_types": ["code"],
+        "token_endpoint_auth_method": "client_secret_post",
+    }
+)
+
+# Only these keys matter on the OAuth redirect, so match them directly
+_CB_RE = re.compile(r"(?:^|&)(code|state|error)=([^&#]+)")
+
 AUTH_SUCCESSFUL_MSG=b"""
 <html>
 <body>
@@ -37,16 +53,51 @@ AUTH_SUCCESSFUL_MSG=b"""
 </html>
 """
 
-def get_failure_msg(query_params: dict) -> bytes:
-    return f"""
+_FAILURE_TMPL=b"""
 <html>
 <body>
     <h1>Authorization Failed</h1>
-    <p>Error: {query_params['error'][0]}</p>
+    <p>Error: %b</p>
     <p>You can close this window and return to the terminal.</p>
 </body>
 </html>
-""".encode()
+"""
+
+def get_failure_msg(query_params: dict) -> bytes:
+    return _FAILURE_TMPL % html.escape(query_params["error"][0]).encode()
+
+
+def _settle_future(future: asyncio.Future, result: Any = None, error: Exception | None = None) -> None:
+    """Complete the callback future, ignoring it if already done (e.g. timed out)."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+async def _ainput(prompt: str) -> str:
+    """input() that doesn't block the event loop.
+
+    The read runs on a daemon thread rather than the default executor, so a
+    prompt abandoned on Ctrl-C can't hold up interpreter shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _read() -> None:
+        try:
+            result, error = input(prompt), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(_settle_future, future, result, error)
+        except RuntimeError:
+            pass  # Loop already closed; nobody is waiting for this line
+
+    threading.Thread(target=_read, daemon=True).start()
+    return await future
 
 
 class InMemoryTokenStorage(TokenStorage):
@@ -58,37 +109,45 @@ class InMemoryTokenStorage(TokenStorage):
         self._client_info: OAuthClientInformationFull | None = None
 
     async def get_tokens(self) -> OAuthToken | None:
-        logger.info(f"Getting tokens {self._tokens}")
+        logger.debug("Getting tokens {}", self._tokens)
         return self._tokens
 
     async def set_tokens(self, tokens: OAuthToken) -> None:
-        logger.info(f"Setting tokens {tokens}")
+        logger.debug("Setting tokens {}", tokens)
         self._tokens = tokens
 
     async def get_client_info(self) -> OAuthClientInformationFull | None:
-        logger.info(f"Getting client info {self._client_info}")
+        logger.debug("Getting client info {}", self._client_info)
         return self._client_info
 
     async def set_client_info(self, client_info: OAuthClientInformationFull) -> None:
-        logger.info(f"Setting client info {self._client_info}")
+        logger.debug("Setting client info {}", client_info)
         self._client_info = client_info
 
 
 class CallbackHandler(BaseHTTPRequestHandler):
     """Simple HTTP handler to capture OAuth callback."""
 
-    def __init__(self, request, client_address, server, callback_data):
-        """Initialize with callback data storage."""
+    def __init__(self, request, client_address, server, callback_data, on_complete):
+        """Initialize with callback data storage and a completion hook."""
         self.callback_data = callback_data
+        self.on_complete = on_complete
         super().__init__(request, client_address, server)
-        logger.info(f"Callback data: {callback_data} and {urlparse(self.path)}")
+        logger.opt(lazy=True).debug("Callback data: {} and {}", lambda: callback_data, lambda: urlparse(self.path))
 
     def do_GET(self):
         """Handle GET request from OAuth redirect."""
-        parsed = urlparse(self.path)
-        query_params = parse_qs(parsed.query)
+        if self.path.partition("?")[0] != "/callback":
+            # Favicon and other probes: answer right away without parsing
+            self.send_response(204)
+            self.end_headers()
+            return
+
+        query_params: dict[str, list[str]] = {}
+        for match in _CB_RE.finditer(self.path.partition("?")[2]):
+            query_params.setdefault(match.group(1), [unquote_plus(match.group(2))])
 
-        logger.info("Query params: {query_params}")
+        logger.debug("Query params: {}", query_params)
 
         if "code" in query_params:
             self.callback_data["authorization_code"] = query_params["code"][0]
@@ -97,12 +156,14 @@ class CallbackHandler(BaseHTTPRequestHandler):
             self.send_header("Content-type", "text/html")
             self.end_headers()
             self.wfile.write(AUTH_SUCCESSFUL_MSG)
+            self.on_complete(result=(self.callback_data["authorization_code"], self.callback_data["state"]))
         elif "error" in query_params:
             self.callback_data["error"] = query_params["error"][0]
             self.send_response(400)
             self.send_header("Content-type", "text/html")
             self.end_headers()
             self.wfile.write(get_failure_msg(query_params))
+            self.on_complete(error=Exception(f"OAuth error: {self.callback_data['error']}"))
         else:
             self.send_response(404)
             self.end_headers()
@@ -119,29 +180,46 @@ class CallbackServer:
         self.port = cb_port
         self.server_instance = None
         self.thread = None
+        self._started = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._future: asyncio.Future | None = None
         self.callback_data = {"authorization_code": None, "state": None, "error": None}
 
     def _create_handler_with_data(self):
         """Create a handler class with access to callback data."""
         callback_data = self.callback_data
+        on_complete = self._complete
 
         class DataCallbackHandler(CallbackHandler):
             def __init__(self, request, client_address, server):
-                logger.info(f"Request {request}")
-                logger.info(f"Client Addr {client_address}")
-                logger.info(f"Server {server}")
-                super().__init__(request, client_address, server, callback_data)
+                logger.debug("Request {}", request)
+                logger.debug("Client Addr {}", client_address)
+                logger.debug("Server {}", server)
+                super().__init__(request, client_address, server, callback_data, on_complete)
 
         return DataCallbackHandler
 
+    def _complete(self, result: Any = None, error: Exception | None = None):
+        """Resolve the callback future from the server thread."""
+        self._loop.call_soon_threadsafe(_settle_future, self._future, result, error)
+
     def start(self):
+        """Start serving callbacks in a background thread.
+
+        Must be called from a coroutine: the callback future is bound to the
+        running event loop, so this raises RuntimeError if there is none.
+        """
         logger.info("*" * 80)
         logger.info("Starting callback server...")
+        self.callback_data.update(authorization_code=None, state=None, error=None)
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
         handler_class = self._create_handler_with_data()
-        self.server_instance = HTTPServer((self.host, self.port), handler_class)
+        self.server_instance = ThreadingHTTPServer((self.host, self.port), handler_class)
         self.thread = threading.Thread(target=self.server_instance.serve_forever, daemon=True)
         self.thread.start()
-        logger.info(f"🖥️  Started callback server on http://{self.host}:{self.port}")
+        self._started = True
+        logger.info("🖥️  Started callback server on http://{}:{}", self.host, self.port)
         logger.info("*" * 80)
 
     def stop(self):
@@ -153,75 +231,63 @@ class CallbackServer:
             self.server_instance.server_close()
         if self.thread:
             self.thread.join(timeout=1)
+        self._started = False
 
-    def wait_for_callback(self, timeout=300):
-        """Wait for OAuth callback with timeout."""
+    async def wait_for_callback_async(self, timeout=300) -> tuple[str, str | None]:
+        """Await OAuth callback with timeout without blocking the event loop."""
         logger.info(f"Waiting for authorization callback for {timeout} seconds...")
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            # logger.info(f"Waiting for callback.... {time.time() - start_time}")
-            if self.callback_data["authorization_code"]:
-                logger.info(f"Callback received! Auth code: {self.callback_data["authorization_code"]}")
-                return self.callback_data["authorization_code"]
-            elif self.callback_data["error"]:
-                raise Exception(f"OAuth error: {self.callback_data['error']}")
-
-            time.sleep(0.1)
-        raise Exception("Timeout waiting for OAuth callback")
-
-    def get_state(self):
-        """Get the received state parameter."""
-        return self.callback_data["state"]
+        try:
+            auth_code, state = await asyncio.wait_for(self._future, timeout)
+        except asyncio.TimeoutError:
+            raise Exception("Timeout waiting for OAuth callback") from None
+        logger.info(f"Callback received! Auth code: {auth_code}")
+        return auth_code, state
 
 
 class MCPAuthClient:
     """MCP client with OAuth support."""
 
-    def __init__(self, server_url: str, cb_host: str, cb_port: int, transport: str = "streamable_http"):
+    def __init__(self, server_url: str, cb_host: str, cb_port: int, transport: str = "streamable-http"):
         self.server_url = server_url
         self.cb_host = cb_host
         self.cb_port = cb_port
-        self.transport = transport
+        self.transport = transport.replace("_", "-").lower()
+        if self.transport not in SUPPORTED_TRANSPORTS:
+            raise ValueError(f"Non supported transport {transport}!!!")
         self.session: ClientSession | None = None
 
     async def connect_2_mcp_server(self):
         logger.info(f"🔗 Attempting to connect to {self.server_url}...")
 
         try:
+            # Only bound when the provider needs a browser flow; cached/refreshed tokens skip it
             callback_server = CallbackServer(cb_host=self.cb_host, cb_port=self.cb_port)
-            callback_server.start()
 
             async def callback_handler() -> tuple[str, str | None]:
                 """Wait for OAuth callback and return auth code and state."""
                 logger.info("⏳ Waiting for authorization callback...")
                 try:
-                    auth_code = callback_server.wait_for_callback(timeout=300)
-                    logger.info(f"Auth code:{auth_code} Callback server state {callback_server.get_state()}")
-                    return auth_code, callback_server.get_state()
+                    if not callback_server._started:
+                        callback_server.start()
+                    auth_code, state = await callback_server.wait_for_callback_async(timeout=300)
+                    logger.info(f"Auth code:{auth_code} Callback server state {state}")
+                    return auth_code, state
                 finally:
                     callback_server.stop()
 
             async def _default_redirect_handler(authorization_url: str) -> None:
                 """Default redirect handler that opens the URL in a browser."""
+                # Bind before the browser can be redirected back to us
+                if not callback_server._started:
+                    callback_server.start()
                 logger.info(f"Opening browser for authorization: {authorization_url}")
                 webbrowser.open(authorization_url)
 
-            client_metadata_dict = {
-                "client_name": "fps_github_mcp_server",
-                "redirect_uris": ["http://localhost:3030/callback"],
-                "grant_types": ["authorization_code", "refresh_token"],
-                "response_types": ["code"],
-                "token_endpoint_auth_method": "client_secret_post",
-            }
-
-
             # Create OAuth authentication handler using the new interface
             logger.warning(f"Server url: {self.server_url}")
             oauth_auth = OAuthClientProvider(
                 server_url=self.server_url.replace("/mcp", ""),
-                client_metadata=OAuthClientMetadata.model_validate(
-                    client_metadata_dict
-                ),
+                client_metadata=_CLIENT_METADATA,
                 storage=InMemoryTokenStorage(),
                 redirect_handler=_default_redirect_handler,
                 callback_handler=callback_handler,
@@ -237,7 +303,7 @@ class MCPAuthClient:
                         timeout=60,
                     ) as (read_stream, write_stream):
                         await self._run_session(read_stream, write_stream, None)
-                case 'streamable-http':
+                case "streamable-http":
                     logger.info("📡 Opening StreamableHTTP transport connection with auth...")
                     async with streamablehttp_client(
                         url=self.server_url,
@@ -324,7 +390,7 @@ class MCPAuthClient:
 
         while True:
             try:
-                command = input("mcp> ").strip()
+                command = (await _ainput("mcp> ")).strip()
 
                 if not command:
                     continue
@@ -356,14 +422,11 @@ class MCPAuthClient:
                 else:
                     logger.warning("❌ Unknown command. Try 'list', 'call <tool_name>', or 'quit'")
 
-            except KeyboardInterrupt:
-                logger.info("\n\n👋 Goodbye!")
-                break
             except EOFError:
                 break
 
 
-async def main(host: str, port: int, cbhost: str, cbport: int, transport: Literal["stdio", "sse", "streamable-http"]):
+async def main(host: str, port: int, cbhost: str, cbport: int, transport: Literal["sse", "streamable-http"]):
     server_url = f"http://{host}:{port}" + ("/mcp" if transport == "streamable-http" else "/sse")
     logger.info(f"🚀 MCP Auth Client connecting to: {server_url} ({transport})")
 
@@ -382,9 +445,13 @@ async def main(host: str, port: int, cbhost: str, cbport: int, transport: Litera
 )
 @click.option("--cbhost", default="localhost", help="Callback Host")
 @click.option("--cbport", default=os.environ.get("CB_PORT", 3030), help="Callback port to listen on")
-def cli(host: str, port: int, cbhost: str, cbport: int, transport: Literal["stdio", "sse", "streamable-http"]):
+def cli(host: str, port: int, cbhost: str, cbport: int, transport: Literal["sse", "streamable-http"]):
     """CLI entry point for uv script."""
-    asyncio.run(main(host, port, cbhost, cbport, transport))
+    try:
+        asyncio.run(main(host, port, cbhost, cbport, transport))
+    except KeyboardInterrupt:
+        # asyncio.run turns the Ctrl-C cancellation of the main task into KeyboardInterrupt
+        logger.info("\n\n👋 Goodbye!")
 
 
 if __name__ == "__main__":
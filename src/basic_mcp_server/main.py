@@ -8,26 +8,16 @@ import click
 
 from httpx import Request, Response
 from loguru import logger
-from pathlib import Path
 
 from mcp.server.fastmcp import FastMCP
 from mcp.server.auth.settings import AuthSettings, ClientRegistrationOptions
-from mcp.server.auth.middleware.auth_context import get_access_token
 from pydantic import AnyHttpUrl, BaseModel
 from starlette.exceptions import HTTPException
-from starlette.responses import RedirectResponse
 
+from basic_mcp_server._paths import find_project_root
 from basic_mcp_server.oauth_provider import SimpleOAuthProvider, SimpleAuthSettings
  
 
-def find_project_root():
-    current = Path(__file__).resolve()
-    while current != current.parent:
-        if (current / 'pyproject.toml').exists():
-            return current
-        current = current.parent
-    return current
-
 PROJECT_ROOT = find_project_root()
 
 